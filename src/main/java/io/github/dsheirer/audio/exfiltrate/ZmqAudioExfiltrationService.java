@@ -34,11 +34,10 @@ import org.slf4j.LoggerFactory;
 import org.zeromq.SocketType;
 import org.zeromq.ZContext;
 import org.zeromq.ZMQ.Socket;
+import org.zeromq.ZMsg;
 
 import java.nio.ByteBuffer;
 import java.nio.ByteOrder;
-import java.util.Arrays;
-import java.util.Base64;
 import java.util.HashMap;
 import java.util.List;
 import java.util.Map;
@@ -60,6 +59,7 @@ public class ZmqAudioExfiltrationService
     private ZContext mContext;
     private Socket mPublisher;
     private final Gson mGson;
+    private final Object mPublishLock = new Object();
     private final AtomicBoolean mEnabled = new AtomicBoolean(false);
     private String mEndpoint;
     private UserPreferences mUserPreferences;
@@ -216,10 +216,13 @@ public class ZmqAudioExfiltrationService
     {
         mEnabled.set(false);
         
-        if(mPublisher != null)
+        synchronized(mPublishLock)
         {
-            mPublisher.close();
-            mPublisher = null;
+            if(mPublisher != null)
+            {
+                mPublisher.close();
+                mPublisher = null;
+            }
         }
         
         if(mContext != null)
@@ -256,18 +259,29 @@ public class ZmqAudioExfiltrationService
             // Extract identifier information
             extractIdentifierInformation(metadata, identifierCollection);
             
-            // Create complete message in the format expected by the consumer
+            // Create metadata frame in the format expected by the consumer
             Map<String, Object> message = new HashMap<>();
-            message.put("audio", Arrays.toString(pcmData));  // Convert to string representation
             message.put("metadata", metadata);
             message.put("timestamp", timestamp);
             
-            // Serialize and publish
+            // Serialize and publish as a two frame message: JSON metadata followed by raw PCM audio
             String json = mGson.toJson(message);
             
+            ZMsg zmsg = new ZMsg();
+            zmsg.add(json.getBytes("UTF-8"));
+            zmsg.add(pcmData);
+            
             try 
             {
-                mPublisher.send(json.getBytes("UTF-8"), 0);
+                // Audio modules publish from multiple channels - send both frames under one lock so
+                // frames from different calls can never interleave on the shared socket
+                synchronized(mPublishLock)
+                {
+                    if(mPublisher != null && !zmsg.send(mPublisher))
+                    {
+                        mLog.debug("ZMQ send failed - audio message dropped");
+                    }
+                }
             }
             catch(IndexOutOfBoundsException e)
             {
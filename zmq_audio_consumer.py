@@ -6,19 +6,176 @@ Connects to SDRTrunk's ZMQ audio exfiltration service and receives DMR audio wit
 
 import zmq
 import json
-import base64
-import wave
 import argparse
+import functools
+import os
+import queue
+import struct
 import sys
+import threading
 from datetime import datetime
 
+# orjson is optional; it parses straight from bytes and is much faster than stdlib json
+try:
+    import orjson
+
+    def parse_json(data):
+        """Parse a JSON document from bytes, memoryview or str"""
+        return orjson.loads(data)
+
+    def format_json(obj):
+        """Pretty-print an object as indented JSON"""
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    def parse_json(data):
+        """Parse a JSON document from bytes, memoryview or str"""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def format_json(obj):
+        """Pretty-print an object as indented JSON"""
+        return json.dumps(obj, indent=2)
+
+# Kernel TCP buffer size for the subscriber socket
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024
+
+@functools.lru_cache(maxsize=128)
+def format_hms(seconds):
+    """Format epoch seconds as local HH:MM:SS; cached since bursts of messages share a second"""
+    return datetime.fromtimestamp(seconds).strftime('%H:%M:%S')
+
+# 44-byte RIFF/WAVE header for PCM audio, packed in a single call
+WAV_HEADER = struct.Struct('<4sI4s4sIHHIIHH4sI')
+
+def write_all(fd, buffers):
+    """Write every buffer to fd in order, resuming after short writes"""
+    pending = [memoryview(buffer).cast('B') for buffer in buffers if len(buffer)]
+    while pending:
+        if hasattr(os, 'writev'):
+            written = os.writev(fd, pending)
+        else:
+            # Windows has no writev
+            written = os.write(fd, pending[0])
+        if written <= 0:
+            raise OSError(f"write made no progress with {sum(map(len, pending))} bytes left")
+        
+        # Drop fully written buffers and trim a partially written one
+        while written:
+            if written >= len(pending[0]):
+                written -= len(pending[0])
+                pending.pop(0)
+            else:
+                pending[0] = pending[0][written:]
+                written = 0
+
 def create_wave_file(audio_data, sample_rate, filename):
-    """Save PCM audio data to a WAV file"""
-    with wave.open(filename, 'wb') as wav_file:
-        wav_file.setnchannels(1)  # Mono
-        wav_file.setsampwidth(2)  # 16-bit
-        wav_file.setframerate(sample_rate)
-        wav_file.writeframes(audio_data)
+    """Save PCM audio data to a WAV file (mono, 16-bit)"""
+    data_length = len(audio_data)
+    header = WAV_HEADER.pack(b'RIFF', 36 + data_length, b'WAVE',
+                             b'fmt ', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+                             b'data', data_length)
+    
+    # Hand header and audio to the kernel together, bypassing Python's buffered file layer
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        write_all(fd, (header, audio_data))
+    finally:
+        os.close(fd)
+
+def process_messages(messages, args, worker_failed):
+    """Run the message worker, setting worker_failed if it dies so the receive loop stops waiting on it"""
+    try:
+        _process_messages(messages, args)
+    except BrokenPipeError:
+        # Output was closed (e.g. piped into head); nothing more can be reported
+        worker_failed.set()
+    except Exception as e:
+        worker_failed.set()
+        print(f"Message worker stopped: {e}", file=sys.stderr)
+
+def _process_messages(messages, args):
+    """Worker loop that parses, reports and optionally saves received messages until None is queued"""
+    audio_counter = 0
+    
+    while True:
+        frames = messages.get()
+        if frames is None:
+            break
+        
+        try:
+            # Parse JSON metadata frame
+            message = parse_json(frames[0].buffer)
+            
+            # Extract metadata
+            timestamp = message.get('timestamp', 0)
+            metadata = message.get('metadata') or {}
+            protocol = metadata.get('protocol')
+            frequency = metadata.get('frequency')
+            timeslot = metadata.get('timeslot')
+            from_info = metadata.get('from') or {}
+            to_info = metadata.get('to') or {}
+            lcn = metadata.get('lcn')
+            
+            # Convert timestamp to readable format
+            hms = format_hms(timestamp // 1000)
+            
+            audio_counter += 1
+            lines = [f"\n[{hms}] Audio #{audio_counter}:"]
+            
+            if protocol:
+                lines.append(f"  Protocol: {protocol}")
+            if frequency:
+                lines.append(f"  Frequency: {frequency} Hz")
+            if timeslot is not None:
+                lines.append(f"  Timeslot: {timeslot}")
+            
+            # FROM information
+            from_id = from_info.get('id')
+            if from_id is not None:
+                lines.append(f"  From: {from_id} ({from_info.get('alias', 'No alias')})")
+            
+            # TO information
+            to_id = to_info.get('id')
+            if to_id is not None:
+                lines.append(f"  To: {to_id} ({to_info.get('alias', 'No alias')})")
+            
+            # LCN information
+            if lcn is not None:
+                lines.append(f"  LCN: {lcn}")
+            
+            # Save audio if present
+            if args.save_audio:
+                try:
+                    if len(frames) < 2:
+                        raise ValueError("unsupported message format (expected metadata and audio frames)")
+                    
+                    # Raw PCM audio frame
+                    audio_data = frames[1].buffer
+                    
+                    # Save as WAV file
+                    if audio_data:
+                        filename = f"dmr_audio_{audio_counter:04d}_{int(timestamp)}.wav"
+                        create_wave_file(audio_data, 8000, filename)
+                        lines.append(f"  Audio saved: {filename} ({len(audio_data)} bytes)")
+                    
+                except Exception as e:
+                    lines.append(f"  Error processing audio: {e}")
+            
+            if args.verbose:
+                lines.append(f"  Raw metadata: {format_json(metadata)}")
+            
+            # Report the whole message with a single write
+            sys.stdout.write("\n".join(lines) + "\n")
+            
+        except json.JSONDecodeError as e:
+            print(f"Error parsing JSON message: {e}")
+        except Exception as e:
+            print(f"Error processing message: {e}")
+        
+        # Reports are batched while messages are backed up; push them out once caught up
+        if messages.empty():
+            sys.stdout.flush()
 
 def main():
     parser = argparse.ArgumentParser(description='ZeroMQ Audio Consumer for SDRTrunk')
@@ -26,15 +183,35 @@ def main():
                        help='ZeroMQ endpoint to connect to (default: tcp://localhost:15023)')
     parser.add_argument('--save-audio', action='store_true', 
                        help='Save received audio to WAV files')
+    parser.add_argument('--hwm', type=int, default=100000,
+                       help='Receive high water mark in messages, 0 = unlimited (default: 100000)')
+    parser.add_argument('--io-threads', type=int, default=max(1, (os.cpu_count() or 1) // 4),
+                       help='Number of ZeroMQ I/O threads (default: a quarter of the CPU cores)')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Enable verbose output')
     
     args = parser.parse_args()
     
+    if not sys.stdout.isatty():
+        # Coalesce many message reports into each write() when output is piped or redirected
+        sys.stdout = open(sys.stdout.fileno(), 'w', buffering=65536, closefd=False,
+                          encoding=sys.stdout.encoding, errors=sys.stdout.errors)
+    
     # Create ZeroMQ context and subscriber socket
-    context = zmq.Context()
+    context = zmq.Context.instance(io_threads=args.io_threads)
     socket = context.socket(zmq.SUB)
     
+    # Let the receive queue absorb bursts while messages are being processed
+    socket.setsockopt(zmq.RCVHWM, args.hwm)
+    socket.setsockopt(zmq.RCVBUF, SOCKET_BUFFER_SIZE)
+    
+    # Bound the hand-off queue by the HWM so a slow worker blocks the receive loop and
+    # ZMQ's own high water mark handling applies instead of unbounded memory growth
+    messages = queue.Queue(maxsize=args.hwm)
+    worker_failed = threading.Event()
+    worker = threading.Thread(target=process_messages, args=(messages, args, worker_failed), daemon=True)
+    worker.start()
+    
     try:
         # Connect to the publisher
         socket.connect(args.endpoint)
@@ -43,98 +220,54 @@ def main():
         print(f"ZMQ Audio Consumer listening on {args.endpoint}")
         print("Waiting for audio messages... (Press Ctrl+C to stop)")
         
-        audio_counter = 0
+        # Wait in poll rather than spinning on non-blocking receives; the timeout keeps the
+        # loop responsive to Ctrl+C while idle
+        poller = zmq.Poller()
+        poller.register(socket, zmq.POLLIN)
         
-        while True:
-            # Receive message
-            message_bytes = socket.recv(zmq.NOBLOCK if args.verbose else 0)
+        while not worker_failed.is_set():
+            if not poller.poll(timeout=1000):
+                continue
+            
+            # Receive message frames without copying them out of the libzmq buffers and hand them
+            # to the worker so parsing and file writes never delay the next recv
+            frames = socket.recv_multipart(copy=False)
+            
+            # Wait on a full queue in steps so a dead worker cannot block the loop forever
+            while not worker_failed.is_set():
+                try:
+                    messages.put(frames, timeout=1.0)
+                    break
+                except queue.Full:
+                    pass
             
-            try:
-                # Parse JSON message
-                message = json.loads(message_bytes.decode('utf-8'))
-                
-                # Extract metadata
-                timestamp = message.get('timestamp', 0)
-                metadata = message.get('metadata', {})
-                audio_b64 = message.get('audio', '')
-                
-                # Convert timestamp to readable format
-                dt = datetime.fromtimestamp(timestamp / 1000.0)
-                
-                audio_counter += 1
-                print(f"\n[{dt.strftime('%H:%M:%S')}] Audio #{audio_counter}:")
-                
-                protocol = metadata.get('protocol', 'Unknown')
-                if protocol != 'Unknown':
-                    print(f"  Protocol: {protocol}")
-                
-                frequency = metadata.get('frequency', 'Unknown')
-                if frequency != 'Unknown' and frequency != 0:
-                    print(f"  Frequency: {frequency} Hz")
-                
-                timeslot = metadata.get('timeslot', 'Unknown')
-                if timeslot != 'Unknown':
-                    print(f"  Timeslot: {timeslot}")
-                
-                # FROM information
-                from_info = metadata.get('from', {})
-                if from_info:
-                    from_id = from_info.get('id', 'Unknown')
-                    from_alias = from_info.get('alias', 'No alias')
-                    if from_id != 'Unknown':
-                        print(f"  From: {from_id} ({from_alias})")
-                
-                # TO information
-                to_info = metadata.get('to', {})
-                if to_info:
-                    to_id = to_info.get('id', 'Unknown')
-                    to_alias = to_info.get('alias', 'No alias')
-                    if to_id != 'Unknown':
-                        print(f"  To: {to_id} ({to_alias})")
-                
-                # LCN information
-                lcn = metadata.get('lcn')
-                if lcn is not None:
-                    print(f"  LCN: {lcn}")
-                
-                # Decode audio if present
-                if audio_b64 and args.save_audio:
-                    try:
-                        # Parse the audio data (it's stored as string representation of byte array)
-                        # Convert from "[1, 2, 3, ...]" format to actual bytes
-                        if audio_b64.startswith('[') and audio_b64.endswith(']'):
-                            byte_values = json.loads(audio_b64)
-                            audio_data = bytes(byte_values)
-                        else:
-                            # If it's base64 encoded
-                            audio_data = base64.b64decode(audio_b64)
-                        
-                        # Save as WAV file
-                        audio_counter += 1
-                        filename = f"dmr_audio_{audio_counter:04d}_{int(timestamp)}.wav"
-                        create_wave_file(audio_data, 8000, filename)
-                        print(f"  Audio saved: {filename} ({len(audio_data)} bytes)")
-                        
-                    except Exception as e:
-                        print(f"  Error processing audio: {e}")
-                
-                if args.verbose:
-                    print(f"  Raw metadata: {json.dumps(metadata, indent=2)}")
-                
-            except json.JSONDecodeError as e:
-                print(f"Error parsing JSON message: {e}")
-            except Exception as e:
-                print(f"Error processing message: {e}")
-                
     except KeyboardInterrupt:
         print("\nShutting down...")
-    except zmq.Again:
-        print("No messages available")
     except Exception as e:
         print(f"Error: {e}")
     finally:
-        socket.close()
-        context.term()
+        # Discard the queued backlog so shutdown only waits on the message in progress
+        discarded = 0
+        while True:
+            try:
+                messages.get_nowait()
+                discarded += 1
+            except queue.Empty:
+                break
+        messages.put(None)
+        worker.join()
+        # Tear down the shared context without waiting on undelivered messages
+        context.destroy(linger=0)
+        try:
+            if discarded:
+                print(f"Discarded {discarded} unprocessed messages")
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # Python flushes stdout again at exit; point it at devnull so that cannot fail too
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    
+    if worker_failed.is_set():
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
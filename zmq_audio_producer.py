@@ -7,68 +7,157 @@ Publishes dummy DMR audio messages with realistic metadata.
 
 import zmq
 import json
-import base64
 import time
-import random
 import argparse
+import os
 import numpy as np
 from datetime import datetime
 
+# numba is optional; when present the whole audio synthesis runs as one compiled loop
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Kernel TCP buffer size for the publisher socket
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Sample radio IDs, talkgroups and frequencies for test messages
+RADIO_IDS = (12345, 23456, 34567, 45678, 56789, 67890)
+TALKGROUPS = (100, 101, 102, 200, 201, 300)
+TALKGROUP_NAMES = ('Dispatch', 'Fire', 'EMS', 'Police', 'Ops')
+FREQUENCIES = (462675000, 462700000, 462725000, 467675000, 467700000)
+
+# Dedicated generator for all test data; avoids the locked global random state
+_rng = np.random.default_rng()
+
+# Exclusive upper bounds for the per-message draws unpacked in create_test_message()
+_MESSAGE_DRAW_BOUNDS = np.array([1501, 2, len(FREQUENCIES), len(RADIO_IDS), 20,
+                                 len(TALKGROUPS), len(TALKGROUP_NAMES), 10])
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _gen_audio_kernel(frequency, sample_rate, noise, out):
+        """Fused sine + harmonic + envelope + 16-bit PCM conversion into out.
+
+        The three oscillators are advanced by rotating (sin, cos) pairs rather than calling
+        sin() per sample, which is what makes the compiled loop faster than vectorized NumPy.
+        """
+        samples = out.shape[0]
+        step = 1.0 / sample_rate
+        tone_step = 2 * np.pi * frequency * step
+        harmonic_step = 1.5 * tone_step
+        envelope_step = 2 * np.pi * 2 * step
+        tone_cos, tone_sin = np.cos(tone_step), np.sin(tone_step)
+        harmonic_cos, harmonic_sin = np.cos(harmonic_step), np.sin(harmonic_step)
+        envelope_cos, envelope_sin = np.cos(envelope_step), np.sin(envelope_step)
+        tone_x, tone_y = 0.0, 1.0
+        harmonic_x, harmonic_y = 0.0, 1.0
+        envelope_x, envelope_y = 0.0, 1.0
+        for i in range(samples):
+            value = 0.3 * tone_x + 0.1 * harmonic_x + 0.05 * noise[i]
+            value *= 0.5 + 0.5 * envelope_x
+            value = min(max(value, -1.0), 1.0)
+            out[i] = np.int16(value * 32767)
+            tone_x, tone_y = tone_x * tone_cos + tone_y * tone_sin, tone_y * tone_cos - tone_x * tone_sin
+            harmonic_x, harmonic_y = (harmonic_x * harmonic_cos + harmonic_y * harmonic_sin,
+                                      harmonic_y * harmonic_cos - harmonic_x * harmonic_sin)
+            envelope_x, envelope_y = (envelope_x * envelope_cos + envelope_y * envelope_sin,
+                                      envelope_y * envelope_cos - envelope_x * envelope_sin)
+else:
+    _gen_audio_kernel = None
+
+# Row 0 holds the sample index 0, 1, 2, ...; rows 1-3 are reusable work buffers. FP32 is
+# plenty for audio that ends up as 16-bit PCM and halves the memory traffic of FP64.
+_scratch = np.empty((4, 0), dtype=np.float32)
+
+def _scratch_buffers(samples):
+    """Sample index and float32 work buffers, grown on demand to fit the requested sample count"""
+    global _scratch
+    if _scratch.shape[1] < samples:
+        _scratch = np.empty((4, samples), dtype=np.float32)
+        _scratch[0] = np.arange(samples, dtype=np.float32)
+    return _scratch[0, :samples], _scratch[1, :samples], _scratch[2, :samples], _scratch[3, :samples]
+
 def generate_test_audio(duration_ms=1000, sample_rate=8000):
     """Generate test audio data (sine wave + noise)"""
     samples = int(duration_ms * sample_rate / 1000)
     
+    frequency = 800 + int(_rng.integers(-200, 201))  # Voice-like frequency
+    
+    if _gen_audio_kernel is not None:
+        noise = _rng.standard_normal(samples, dtype=np.float32)  # Background noise
+        pcm_data = np.empty(samples, dtype=np.int16)
+        _gen_audio_kernel(frequency, sample_rate, noise, pcm_data)
+        return pcm_data.tobytes()
+    
     # Generate a sine wave with some noise to simulate voice
-    t = np.linspace(0, duration_ms/1000, samples)
-    frequency = 800 + random.randint(-200, 200)  # Voice-like frequency
+    index, phase, audio, work = _scratch_buffers(samples)
     
     # Generate sine wave with amplitude modulation and noise
-    audio = 0.3 * np.sin(2 * np.pi * frequency * t)
-    audio += 0.1 * np.sin(2 * np.pi * frequency * 1.5 * t)  # Harmonic
-    audio += 0.05 * np.random.normal(0, 1, samples)  # Background noise
+    np.multiply(index, np.float32(2 * np.pi * frequency / sample_rate), out=phase)
+    np.sin(phase, out=audio)
+    audio *= 0.3
+    phase *= 1.5
+    np.sin(phase, out=work)  # Harmonic
+    work *= 0.1
+    audio += work
+    _rng.standard_normal(dtype=np.float32, out=work)  # Background noise
+    work *= 0.05
+    audio += work
     
-    # Add some amplitude variation to simulate speech
-    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 2 * t)  # 2 Hz modulation
-    audio *= envelope
+    # Add some amplitude variation to simulate speech, with the envelope pre-scaled
+    # to 16-bit full scale so the PCM conversion needs no separate multiply pass
+    np.multiply(index, np.float32(2 * np.pi * 2 / sample_rate), out=work)  # 2 Hz modulation
+    np.sin(work, out=work)
+    work *= 0.5 * 32767
+    work += 0.5 * 32767
+    audio *= work
     
     # Convert to 16-bit PCM
-    audio = np.clip(audio, -1.0, 1.0)
-    pcm_data = (audio * 32767).astype(np.int16)
+    np.clip(audio, -32767.0, 32767.0, out=audio)
+    pcm_data = audio.astype(np.int16)
     
     return pcm_data.tobytes()
 
 def create_test_message(message_id):
-    """Create a realistic test message with audio and metadata"""
+    """Create a realistic test message, returned as a (metadata message, PCM audio bytes) pair"""
     
-    # Sample radio IDs and talkgroups
-    radio_ids = [12345, 23456, 34567, 45678, 56789, 67890]
-    talkgroups = [100, 101, 102, 200, 201, 300]
-    frequencies = [462675000, 462700000, 462725000, 467675000, 467700000]
+    # Draw every random field of the message in a single call
+    (duration, timeslot, frequency, radio, unit,
+     talkgroup, talkgroup_name, lcn) = _rng.integers(_MESSAGE_DRAW_BOUNDS).tolist()
     
     # Generate test audio
-    audio_data = generate_test_audio(duration_ms=random.randint(500, 2000))
+    audio_data = generate_test_audio(duration_ms=500 + duration)
     
     # Create message structure matching SDRTrunk format
     message = {
-        "audio": str(list(audio_data)),  # Convert bytes to list representation
         "metadata": {
             "protocol": "DMR",
-            "timeslot": random.randint(1, 2),
-            "frequency": random.choice(frequencies),
+            "timeslot": timeslot + 1,
+            "frequency": FREQUENCIES[frequency],
             "from": {
-                "id": random.choice(radio_ids),
-                "alias": f"Unit {random.randint(1, 20)}"
+                "id": RADIO_IDS[radio],
+                "alias": f"Unit {unit + 1}"
             },
             "to": {
-                "id": random.choice(talkgroups),
-                "alias": f"TG {random.choice(['Dispatch', 'Fire', 'EMS', 'Police', 'Ops'])}"
+                "id": TALKGROUPS[talkgroup],
+                "alias": f"TG {TALKGROUP_NAMES[talkgroup_name]}"
             },
-            "lcn": random.randint(1, 10)
+            "lcn": lcn + 1
         },
         "timestamp": int(time.time() * 1000)
     }
     
-    return message
+    return message, audio_data
+
+def sleep_until(deadline):
+    """Sleep until the given time.perf_counter() deadline, spinning for the final millisecond"""
+    remaining = deadline - time.perf_counter()
+    if remaining > 0.001:
+        time.sleep(remaining - 0.001)
+    while time.perf_counter() < deadline:
+        pass
 
 def main():
     parser = argparse.ArgumentParser(description='ZeroMQ Audio Producer Test Tool')
@@ -78,15 +167,28 @@ def main():
                        help='Interval between messages in seconds (default: 3.0)')
     parser.add_argument('--count', type=int, default=0,
                        help='Number of messages to send (0 = infinite, default: 0)')
+    parser.add_argument('--batch', type=int, default=1,
+                       help='Number of messages to publish back to back per wakeup (default: 1)')
+    parser.add_argument('--hwm', type=int, default=100000,
+                       help='Send high water mark in messages, 0 = unlimited (default: 100000)')
+    parser.add_argument('--io-threads', type=int, default=max(1, (os.cpu_count() or 1) // 4),
+                       help='Number of ZeroMQ I/O threads (default: a quarter of the CPU cores)')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Enable verbose output')
     
     args = parser.parse_args()
     
+    if args.batch < 1:
+        parser.error('--batch must be at least 1')
+    
     # Create ZMQ context and publisher socket
-    context = zmq.Context()
+    context = zmq.Context.instance(io_threads=args.io_threads)
     socket = context.socket(zmq.PUB)
     
+    # Queue bursts instead of dropping them at the default HWM of 1000
+    socket.setsockopt(zmq.SNDHWM, args.hwm)
+    socket.setsockopt(zmq.SNDBUF, SOCKET_BUFFER_SIZE)
+    
     try:
         # Bind to the endpoint
         socket.bind(args.endpoint)
@@ -98,44 +200,53 @@ def main():
         time.sleep(0.5)
         
         message_count = 0
+        next_deadline = time.perf_counter()
         
         while True:
             # Check if we've reached the message limit
             if args.count > 0 and message_count >= args.count:
                 break
             
-            # Create and send test message
-            message = create_test_message(message_count + 1)
-            json_message = json.dumps(message)
+            # Create a batch of test messages up front so they are sent in one burst
+            batch_size = args.batch
+            if args.count > 0:
+                batch_size = min(batch_size, args.count - message_count)
+            messages = [create_test_message(message_count + i + 1) for i in range(batch_size)]
             
-            socket.send_string(json_message)
-            message_count += 1
+            # Each message is a JSON metadata frame followed by a raw PCM audio frame
+            for message, audio_data in messages:
+                socket.send_multipart([json.dumps(message).encode('utf-8'), audio_data])
             
-            if args.verbose:
-                timestamp = datetime.fromtimestamp(message['timestamp'] / 1000.0)
-                metadata = message['metadata']
-                audio_size = len(message['audio'])
+            for message, audio_data in messages:
+                message_count += 1
                 
-                print(f"\n[{timestamp.strftime('%H:%M:%S')}] Message #{message_count}")
-                print(f"  From: {metadata['from']['id']} ({metadata['from']['alias']})")
-                print(f"  To: {metadata['to']['id']} ({metadata['to']['alias']})")
-                print(f"  Frequency: {metadata['frequency']} Hz")
-                print(f"  Timeslot: {metadata['timeslot']}")
-                print(f"  LCN: {metadata['lcn']}")
-                print(f"  Audio size: {audio_size} characters")
-            else:
-                print(f"Sent message #{message_count}")
+                if args.verbose:
+                    timestamp = datetime.fromtimestamp(message['timestamp'] / 1000.0)
+                    metadata = message['metadata']
+                    audio_size = len(audio_data)
+                    
+                    print(f"\n[{timestamp.strftime('%H:%M:%S')}] Message #{message_count}")
+                    print(f"  From: {metadata['from']['id']} ({metadata['from']['alias']})")
+                    print(f"  To: {metadata['to']['id']} ({metadata['to']['alias']})")
+                    print(f"  Frequency: {metadata['frequency']} Hz")
+                    print(f"  Timeslot: {metadata['timeslot']}")
+                    print(f"  LCN: {metadata['lcn']}")
+                    print(f"  Audio size: {audio_size} bytes")
+                else:
+                    print(f"Sent message #{message_count}")
             
-            # Wait for next message
-            time.sleep(args.interval)
+            # Wait for next batch, keeping the average rate at one message per interval.
+            # Deadlines are absolute so time spent building and sending does not cause drift.
+            next_deadline += args.interval * batch_size
+            sleep_until(next_deadline)
             
     except KeyboardInterrupt:
         print(f"\nStopping after {message_count} messages...")
     except Exception as e:
         print(f"Error: {e}")
     finally:
-        socket.close()
-        context.term()
+        # Give queued messages up to a second to go out without hanging on exit
+        context.destroy(linger=1000)
         print("ZMQ Audio Producer stopped")
 
 if __name__ == "__main__":